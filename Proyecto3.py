@@ -1,10 +1,23 @@
 from __future__ import annotations
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple, Any
+from functools import reduce
+from itertools import product
+from operator import mul
+from typing import Dict, List, Optional, Tuple, Any
 import argparse
+import math
+import sys
+import threading
 
 
-@dataclass
+class InvalidQueryError(ValueError):
+    """Consulta o evidencia con una variable o un valor que no existe en la red."""
+
+
+# slots=True (sin __dict__ por instancia) solo existe desde Python 3.10
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
 class Node:
     """
     Nodo de una Red Bayesiana.
@@ -13,11 +26,19 @@ class Node:
     - parents: lista de nombres de variables padre
     - cpt: tabla de probabilidad condicional
            dict: (valores_padres_en_orden) -> { valor_propio: prob }
+    - value_index, parent_ids, strides, table, log_table: la misma CPT
+           codificada en enteros para el motor de inferencia (la llena build_table)
     """
     name: str
     values: List[str]
     parents: List[str] = field(default_factory=list)
     cpt: Dict[Tuple[str, ...], Dict[str, float]] = field(default_factory=dict)
+    # Versión codificada en enteros de la CPT (ver build_table)
+    value_index: Dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+    parent_ids: Tuple[int, ...] = field(default=(), repr=False, compare=False)
+    strides: Tuple[int, ...] = field(default=(), repr=False, compare=False)
+    table: List[float] = field(default_factory=list, repr=False, compare=False)
+    log_table: List[float] = field(default_factory=list, repr=False, compare=False)
 
     def prob(self, value: str, parent_assignment: Dict[str, str]) -> float:
         """
@@ -33,18 +54,290 @@ class Node:
                 f"padres {self.parents}, asignación {parent_assignment}, valor {value}"
             ) from e
 
+    def build_table(self, parent_nodes: List["Node"], parent_ids: List[int]):
+        """
+        Construye la versión codificada en enteros de la CPT:
+        - value_index: valor -> índice en values (set_node_info ya lo crea;
+                       se rehace por si values se cambió directamente)
+        - table: lista plana de probabilidades, con desplazamiento
+                 sum(idx_padre_i * strides[i]) + idx_valor
+        - log_table: log de table (-inf para probabilidad 0)
+        - parent_ids: posición de cada padre en el vector de asignación
+        """
+        self.value_index = {v: i for i, v in enumerate(self.values)}
+        self.parent_ids = tuple(parent_ids)
+
+        strides: List[int] = []
+        stride = len(self.values)
+        for parent in reversed(parent_nodes):
+            strides.append(stride)
+            stride *= len(parent.values)
+        self.strides = tuple(reversed(strides))
+
+        # Se arma aparte y se asigna al final: otra consulta puede estar leyendo la tabla anterior
+        table: List[float] = []
+        for parent_vals in product(*(parent.values for parent in parent_nodes)):
+            dist = self.cpt.get(parent_vals)
+            if dist is None or any(v not in dist for v in self.values):
+                raise KeyError(
+                    f"Falta entrada en CPT para nodo {self.name}, "
+                    f"padres {self.parents}, asignación {dict(zip(self.parents, parent_vals))}"
+                )
+            table.extend(dist[v] for v in self.values)
+        self.log_table = [math.log(p) if p > 0 else -math.inf for p in table]
+        self.table = table
+
+    def row_offset(self, assignment: List[int]) -> int:
+        """
+        Desplazamiento en table de la fila P(self | padres=assignment).
+        assignment es el vector de asignación indexado por parent_ids.
+        """
+        offset = 0
+        for pid, stride in zip(self.parent_ids, self.strides):
+            offset += assignment[pid] * stride
+        return offset
+
+    def row(self, assignment: List[int]) -> List[float]:
+        """Fila completa de la CPT: [P(self=v | padres=assignment) for v in values]."""
+        offset = self.row_offset(assignment)
+        return self.table[offset:offset + len(self.values)]
+
+    def prob_idx(self, value_idx: int, assignment: List[int]) -> float:
+        """
+        Igual que prob, pero con valores codificados como enteros.
+        """
+        return self.table[self.row_offset(assignment) + value_idx]
+
     def __str__(self) -> str:
         parent_str = ", ".join(self.parents) if self.parents else "None"
         return f"Node({self.name}, values={self.values}, parents={parent_str})"
 
 
+def _logsumexp(values: List[float]) -> float:
+    """
+    log(sum(exp(v) for v in values)) sin underflow; -inf si la suma es 0.
+    """
+    if len(values) == 1:
+        return values[0]
+    if not values:
+        return -math.inf
+    m = max(values)
+    if m == -math.inf:
+        return -math.inf
+    return m + math.log(sum([math.exp(v - m) for v in values]))
+
+
+# Estado de cada proceso de enumeration_ask(workers > 1): (red, vars_order, relevantes)
+_worker_state: Optional[Tuple["BayesianNetwork", List[int], List[Tuple[int, ...]]]] = None
+
+
+def _init_worker(bn: "BayesianNetwork", vars_order: List[int]):
+    """
+    Inicializador de cada proceso en enumeration_ask(workers > 1): la red y
+    el orden de variables se serializan una vez por proceso, no por tarea.
+    """
+    global _worker_state
+    _worker_state = (bn, vars_order, bn._relevant_by_depth(vars_order))
+
+
+def _enumerate_in_worker(assignment: List[int]) -> float:
+    """
+    Tarea de cada proceso en enumeration_ask(workers > 1): solo recibe la
+    asignación, con la consulta ya fijada; la caché es de cada tarea.
+    """
+    bn, vars_order, relevant = _worker_state
+    return bn._enumerate_all(vars_order, assignment, 0, relevant, {})
+
+
+# Número máximo de núcleos generados que guarda cada red (ver _compile_kernel)
+_MAX_COMPILED = 64
+
+
+def _offsets(cards: Tuple[int, ...], strides: Tuple[int, ...]) -> List[int]:
+    """
+    Desplazamientos (en una tabla con los strides dados) de todas las
+    combinaciones de valores de variables con cardinalidades cards,
+    en orden lexicográfico (la última variable varía más rápido).
+    """
+    offsets = [0]
+    for card, stride in zip(cards, strides):
+        offsets = [o + k * stride for o in offsets for k in range(card)]
+    return offsets
+
+
+def _restrict_tables(
+    restrictions: List[Tuple[List[float], List[Tuple[int, int]], List[int], int, int]],
+    assignment: List[int],
+) -> List[List[float]]:
+    """
+    Tablas del núcleo de _compile_kernel restringidas a la evidencia de
+    assignment, una por profundidad. Cada restricción es (log_table, padres
+    fijados como (id, stride), desplazamientos de los padres libres, id del
+    nodo si su propio valor queda fijado o -1, nº de valores del nodo).
+    """
+    tables: List[List[float]] = []
+    for log_table, fixed, offsets, y_id, card in restrictions:
+        base = sum(assignment[pid] * st for pid, st in fixed)
+        if y_id >= 0:
+            base += assignment[y_id]
+            tables.append([log_table[base + o] for o in offsets])
+        else:
+            tables.append([lp for o in offsets for lp in log_table[base + o:base + o + card]])
+    return tables
+
+
+@dataclass
+class Factor:
+    """
+    Factor para la eliminación de variables.
+    - variables: ids de los nodos de los que depende
+    - cards: número de valores de cada variable
+    - table: lista plana de valores, la última variable varía más rápido
+             (la misma disposición que Node.table)
+    """
+    variables: Tuple[int, ...]
+    cards: Tuple[int, ...]
+    table: List[float]
+
+    def strides(self) -> Tuple[int, ...]:
+        strides: List[int] = []
+        stride = 1
+        for card in reversed(self.cards):
+            strides.append(stride)
+            stride *= card
+        return tuple(reversed(strides))
+
+    def restrict(self, assignment: List[int]) -> "Factor":
+        """
+        Fija las variables asignadas (assignment[v] >= 0) y las elimina del factor.
+        """
+        base = 0
+        free_vars: List[int] = []
+        free_cards: List[int] = []
+        free_strides: List[int] = []
+        for var, card, stride in zip(self.variables, self.cards, self.strides()):
+            if assignment[var] >= 0:
+                base += assignment[var] * stride
+            else:
+                free_vars.append(var)
+                free_cards.append(card)
+                free_strides.append(stride)
+        if len(free_vars) == len(self.variables):
+            return self
+        table = [self.table[base + o] for o in _offsets(tuple(free_cards), tuple(free_strides))]
+        return Factor(tuple(free_vars), tuple(free_cards), table)
+
+    def _union(self, other: "Factor") -> Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]]:
+        """
+        Unión de las variables de self y other (primero las de self), sus
+        cardinalidades y los strides de cada factor sobre esa unión (0 para
+        las variables que el factor no tiene).
+        """
+        variables = list(self.variables)
+        cards = list(self.cards)
+        for var, card in zip(other.variables, other.cards):
+            if var not in self.variables:
+                variables.append(var)
+                cards.append(card)
+
+        def aligned(f: "Factor") -> Tuple[int, ...]:
+            by_var = dict(zip(f.variables, f.strides()))
+            return tuple(by_var.get(var, 0) for var in variables)
+
+        return tuple(variables), tuple(cards), aligned(self), aligned(other)
+
+    def multiply(self, other: "Factor") -> "Factor":
+        """
+        Producto punto a punto; el resultado depende de la unión de variables.
+        """
+        variables, cards, strides1, strides2 = self._union(other)
+        t1, t2 = self.table, other.table
+        table = [
+            t1[a] * t2[b]
+            for a, b in zip(_offsets(cards, strides1), _offsets(cards, strides2))
+        ]
+        return Factor(variables, cards, table)
+
+    def multiply_sum_out(self, other: "Factor", var: int) -> "Factor":
+        """
+        Igual que self.multiply(other).sum_out(var), pero en una sola pasada:
+        cada celda del resultado suma los productos directamente, sin
+        construir el factor producto intermedio.
+        """
+        variables, cards, strides1, strides2 = self._union(other)
+        pos = variables.index(var)
+        card, s1, s2 = cards[pos], strides1[pos], strides2[pos]
+        rest_cards = cards[:pos] + cards[pos + 1:]
+        t1, t2 = self.table, other.table
+        table = [
+            sum(t1[a + k * s1] * t2[b + k * s2] for k in range(card))
+            for a, b in zip(
+                _offsets(rest_cards, strides1[:pos] + strides1[pos + 1:]),
+                _offsets(rest_cards, strides2[:pos] + strides2[pos + 1:]),
+            )
+        ]
+        return Factor(variables[:pos] + variables[pos + 1:], rest_cards, table)
+
+    def rescaled(self) -> "Factor":
+        """
+        El mismo factor dividido por su valor máximo (si no es 0). Como la
+        constante es igual para todos los valores de la consulta, se cancela
+        al normalizar y evita el underflow al multiplicar muchos factores.
+        """
+        m = max(self.table, default=0.0)
+        if m == 0.0 or m == 1.0:
+            return self
+        return Factor(self.variables, self.cards, [x / m for x in self.table])
+
+    def sum_out(self, var: int) -> "Factor":
+        """
+        Marginaliza (suma) la variable var.
+        """
+        pos = self.variables.index(var)
+        strides = self.strides()
+        card, stride = self.cards[pos], strides[pos]
+        rest_cards = self.cards[:pos] + self.cards[pos + 1:]
+        rest_strides = strides[:pos] + strides[pos + 1:]
+        t = self.table
+        table = [
+            sum(t[o + k * stride] for k in range(card))
+            for o in _offsets(rest_cards, rest_strides)
+        ]
+        return Factor(self.variables[:pos] + self.variables[pos + 1:], rest_cards, table)
+
+
 class BayesianNetwork:
     """
     Implementación básica de Red Bayesiana + motor de inferencia por enumeración.
+
+    El orden topológico, las raíces y las tablas codificadas se calculan una
+    vez y se guardan; add_edge, set_node_info y set_cpt_entry los descartan.
+    Si se modifican nodes/children directamente hay que llamar a _invalidate()
+    (y las aristas nuevas no quedan registradas en _edges: mejor usar add_edge).
+
+    Se pueden hacer consultas desde varios hilos a la vez: cada consulta
+    guarda su memoización y sus tablas restringidas en variables locales, y
+    _lock protege lo que se comparte (las tablas codificadas y los núcleos
+    generados). Modificar la red mientras hay consultas en curso no es seguro.
     """
     def __init__(self):
         self.nodes: Dict[str, Node] = {}
         self.children: Dict[str, List[str]] = {}
+        # Aristas (padre, hijo) ya agregadas: pertenencia O(1) en add_edge
+        self._edges: set = set()
+        # Nodos en orden topológico; la posición de cada uno es su id entero
+        self._node_list: List[Node] = []
+        self._node_id: Dict[str, int] = {}
+        # Por id: (parent_ids, strides, log_table, nº de valores), para el núcleo de _enumerate_all
+        self._kernel: List[Tuple[Tuple[int, ...], Tuple[int, ...], List[float], int]] = []
+        # Núcleos generados por _compile_kernel:
+        # (vars_order, observadas, consulta) -> (función, restricciones),
+        # del menos al más recientemente usado; _lock protege los accesos
+        self._compiled: "OrderedDict[Tuple[Tuple[int, ...], Tuple[bool, ...], int], Tuple[Any, List[tuple]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tables_ready = False
+        self._topo_cache: Optional[List[str]] = None
+        self._roots_cache: Optional[List[str]] = None
 
     # ================== Manejo de estructura ==================
 
@@ -53,56 +346,150 @@ class BayesianNetwork:
         Agregar arista padre -> hijo a la red.
         Se crean los nodos si no existían.
         """
+        self._invalidate()
+        parent, child = sys.intern(parent), sys.intern(child)
         if parent not in self.nodes:
             self.nodes[parent] = Node(name=parent, values=[])
         if child not in self.nodes:
             self.nodes[child] = Node(name=child, values=[])
 
-        if child not in self.nodes[child].parents:
-            self.nodes[child].parents.append(parent)
-
-        self.children.setdefault(parent, [])
-        if child not in self.children[parent]:
-            self.children[parent].append(child)
+        # Las listas conservan el orden de inserción; el conjunto evita
+        # recorrerlas para saber si la arista ya existía.
+        if (parent, child) in self._edges:
+            return
+        self._edges.add((parent, child))
+        self.nodes[child].parents.append(parent)
+        self.children.setdefault(parent, []).append(child)
 
     def set_node_info(self, name: str, values: List[str]):
         """
         Definir el dominio (valores posibles) de un nodo.
+        Los nombres se internan para que las búsquedas en dicts comparen por identidad.
         """
+        self._invalidate()
+        name = sys.intern(name)
+        values = [sys.intern(v) for v in values]
         if name not in self.nodes:
             self.nodes[name] = Node(name=name, values=values)
         else:
             self.nodes[name].values = values
+        self.nodes[name].value_index = {v: i for i, v in enumerate(values)}
 
-    def set_cpt_entry(self, name: str, parent_values: Tuple[str, ...], value_probs: Dict[str, float]):
+    def set_cpt_entry(
+        self,
+        name: str,
+        parent_values: Tuple[str, ...],
+        value_probs: Dict[str, float],
+        validate: bool = True,
+    ):
         """
         Definir una fila de la CPT para el nodo `name`.
         parent_values es una tupla con los valores de los padres en orden.
         value_probs es un dict valor_propio -> prob.
+        Con validate=False no se verifica que la fila sume 1; from_files lo
+        usa y revisa todas las filas juntas al final con validate().
         """
         node = self.nodes[name]
-        total = sum(value_probs.values())
-        if abs(total - 1.0) > 1e-6:
-            raise ValueError(
-                f"CPT para nodo {name} y padres {parent_values} no suma 1 (suma={total})."
-            )
+        parent_values = tuple(sys.intern(v) for v in parent_values)
+        if validate:
+            total = sum(value_probs.values())
+            if abs(total - 1.0) > 1e-6:
+                raise ValueError(
+                    f"CPT para nodo {name} y padres {parent_values} no suma 1 (suma={total})."
+                )
         node.cpt[parent_values] = value_probs
+        self._invalidate()
+
+    def _invalidate(self):
+        """Descartar lo precalculado a partir de la red (orden topológico, raíces, tablas)."""
+        with self._lock:
+            self._tables_ready = False
+            self._topo_cache = None
+            self._roots_cache = None
+            self._compiled = OrderedDict()
+
+    def __getstate__(self):
+        # Las funciones generadas y el lock no se pueden serializar (workers de enumeration_ask)
+        state = self.__dict__.copy()
+        state["_compiled"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def validate(self):
+        """
+        Verifica que cada nodo tenga valores, que cada fila de su CPT sume 1 y
+        que haya una fila para cada combinación de valores de sus padres (ni
+        más ni menos).
+        """
+        for name, node in self.nodes.items():
+            if not node.values:
+                raise ValueError(f"El nodo {name} no tiene valores (VALUES) definidos.")
+            bad_rows = {
+                parent_vals: total
+                for parent_vals, total in ((k, sum(d.values())) for k, d in node.cpt.items())
+                if abs(total - 1.0) > 1e-6
+            }
+            if bad_rows:
+                raise ValueError(
+                    f"CPT para nodo {name} no suma 1 en las filas (padres: suma): {bad_rows}"
+                )
+            parents = [self.nodes[p] for p in node.parents]
+            for parent in parents:
+                # Sin valores no habría ninguna combinación que revisar
+                if not parent.values:
+                    raise ValueError(
+                        f"El padre {parent.name} del nodo {name} no tiene valores (VALUES) definidos."
+                    )
+            for parent_vals in product(*(parent.values for parent in parents)):
+                if parent_vals not in node.cpt:
+                    raise ValueError(
+                        f"Falta la fila de CPT para nodo {name} con padres "
+                        f"{dict(zip(node.parents, parent_vals))}."
+                    )
+            extra = [k for k in node.cpt if len(k) != len(parents)
+                     or any(v not in parent.value_index for v, parent in zip(k, parents))]
+            if extra:
+                raise ValueError(
+                    f"CPT del nodo {name} tiene filas con valores de padres desconocidos: {extra}"
+                )
 
     def roots(self) -> List[str]:
         """Retorna la lista de nodos raíz (sin padres)."""
-        return [name for name, node in self.nodes.items() if not node.parents]
+        if self._roots_cache is None:
+            self._roots_cache = [name for name, node in self.nodes.items() if not node.parents]
+        return list(self._roots_cache)
 
     def topological_order(self) -> List[str]:
         """
         Orden topológico (padres antes que hijos).
         Implementación de algoritmo de Kahn.
+        El resultado se guarda hasta la siguiente modificación de la red.
         """
-        in_degree = {name: len(node.parents) for name, node in self.nodes.items()}
-        queue = [n for n, d in in_degree.items() if d == 0]
+        return list(self._topological_order())
+
+    def _topological_order(self) -> List[str]:
+        """
+        Igual que topological_order, pero retorna la lista guardada sin
+        copiarla; solo para uso interno (no se debe modificar).
+        """
+        if self._topo_cache is not None:
+            return self._topo_cache
+
+        in_degree: Dict[str, int] = {}
+        queue: deque = deque()
+        for name, node in self.nodes.items():
+            degree = len(node.parents)
+            in_degree[name] = degree
+            if degree == 0:
+                queue.append(name)
         order: List[str] = []
 
         while queue:
-            n = queue.pop(0)
+            n = queue.popleft()
             order.append(n)
             for child in self.children.get(n, []):
                 in_degree[child] -= 1
@@ -111,50 +498,79 @@ class BayesianNetwork:
 
         if len(order) != len(self.nodes):
             raise ValueError("La red tiene un ciclo o algo raro: no se pudo ordenar topológicamente.")
+        self._topo_cache = order
         return order
 
+    def _build_tables(self):
+        """
+        Asigna a cada nodo un id (su posición en orden topológico) y construye
+        su CPT codificada en enteros. Se rehace solo si la red cambió.
+        La construcción se hace con _lock tomado, así que si varios hilos
+        consultan a la vez una red recién modificada solo uno la construye.
+        """
+        if self._tables_ready:
+            return
+        with self._lock:
+            if self._tables_ready:
+                return
+            self._node_list = [self.nodes[name] for name in self._topological_order()]
+            self._node_id = {node.name: i for i, node in enumerate(self._node_list)}
+            for node in self._node_list:
+                node.build_table(
+                    [self.nodes[p] for p in node.parents],
+                    [self._node_id[p] for p in node.parents],
+                )
+            self._kernel = [
+                (node.parent_ids, node.strides, node.log_table, len(node.values))
+                for node in self._node_list
+            ]
+            self._tables_ready = True
+
     # ================== Impresión / visualización ==================
 
     def print_structure(self):
         """
         Imprime en texto la estructura de la red:
         para cada nodo, sus padres e hijos, recorridos en orden topológico.
+        La salida se arma completa y se escribe de una sola vez.
         """
-        print("=== Estructura de la Red Bayesiana ===")
+        out: List[str] = ["=== Estructura de la Red Bayesiana ===\n"]
         roots = self.roots()
-        print(f"Nodos raíz: {', '.join(roots) if roots else 'Ninguno'}")
-        for name in self.topological_order():
+        out.append(f"Nodos raíz: {', '.join(roots) if roots else 'Ninguno'}\n")
+        for name in self._topological_order():
             node = self.nodes[name]
             parents = ", ".join(node.parents) if node.parents else "None"
-            childs = ", ".join(self.children.get(name, [])) if self.children.get(name) else "None"
-            print(f"- {name}")
-            print(f"    Padres: {parents}")
-            print(f"    Hijos : {childs}")
-        print("=== Fin de estructura ===\n")
+            childs_list = self.children.get(name)
+            childs = ", ".join(childs_list) if childs_list else "None"
+            out.append(f"- {name}\n")
+            out.append(f"    Padres: {parents}\n")
+            out.append(f"    Hijos : {childs}\n")
+        out.append("=== Fin de estructura ===\n\n")
+        sys.stdout.write("".join(out))
 
     def print_cpts(self):
         """
         Imprime en texto las tablas de probabilidad condicional (CPT).
+        La salida se arma completa y se escribe de una sola vez.
         """
-        print("=== Tablas de Probabilidad Condicional (CPT) ===")
-        for name in self.topological_order():
+        out: List[str] = ["=== Tablas de Probabilidad Condicional (CPT) ===\n"]
+        for name in self._topological_order():
             node = self.nodes[name]
-            print(f"Nodo: {name}")
-            print(f"Valores: {', '.join(node.values)}")
+            out.append(f"Nodo: {name}\n")
+            out.append(f"Valores: {', '.join(node.values)}\n")
             if not node.parents:
                 dist = node.cpt.get((), {})
-                for val in node.values:
-                    print(f"  P({name}={val}) = {dist.get(val, 'N/A')}")
+                out.extend(f"  P({name}={val}) = {dist.get(val, 'N/A')}\n" for val in node.values)
             else:
-                print(f"Padres: {', '.join(node.parents)}")
-                header = "  " + "  ".join(node.parents) + "  |  " + "  ".join(node.values)
-                print(header)
+                out.append(f"Padres: {', '.join(node.parents)}\n")
+                out.append(f"  {'  '.join(node.parents)}  |  {'  '.join(node.values)}\n")
                 for parent_assign, dist in node.cpt.items():
                     parent_vals_str = "  ".join(parent_assign)
-                    probs_str = "  ".join(f"{dist.get(v, 'N/A')}" for v in node.values)
-                    print(f"  {parent_vals_str}  |  {probs_str}")
-            print()
-        print("=== Fin de tablas CPT ===\n")
+                    probs_str = "  ".join([str(dist.get(v, "N/A")) for v in node.values])
+                    out.append(f"  {parent_vals_str}  |  {probs_str}\n")
+            out.append("\n")
+        out.append("=== Fin de tablas CPT ===\n\n")
+        sys.stdout.write("".join(out))
 
     # ================== Carga desde archivos ==================
 
@@ -183,160 +599,589 @@ class BayesianNetwork:
                 bn.add_edge(parent, child)
 
         # ----- CPTs -----
+        # Se recorre el archivo una sola vez, línea a línea, sin cargarlo completo.
         with open(cpt_path, "r", encoding="utf-8") as f:
-            content = [
-                line.strip()
-                for line in f
-                if line.strip() and not line.strip().startswith("#")
-            ]
+            lines = (
+                stripped
+                for stripped in (raw.strip() for raw in f)
+                if stripped and not stripped.startswith("#")
+            )
 
-        i = 0
-        while i < len(content):
-            line = content[i]
-            if not line.startswith("NODE"):
-                raise ValueError(f"Se esperaba 'NODE <Nombre>' y se encontró: {line}")
-            _, node_name = line.split(None, 1)
-            i += 1
-
-            # VALUES
-            parts = content[i].split()
-            if parts[0] != "VALUES":
-                raise ValueError(
-                    f"Se esperaba 'VALUES' después de NODE {node_name}, "
-                    f"se encontró: {content[i]}"
-                )
-            values = parts[1:]
-            bn.set_node_info(node_name, values)
-            i += 1
-
-            # PARENTS (opcional)
-            parents: List[str] = []
-            if i < len(content) and content[i].startswith("PARENTS"):
-                parents = content[i].split()[1:]
-                # Ajustar padres en el nodo y estructura
-                for p in parents:
-                    if p not in bn.nodes:
-                        bn.nodes[p] = Node(name=p, values=[])
-                    if node_name not in bn.nodes:
-                        bn.nodes[node_name] = Node(name=node_name, values=values)
-                    if p not in bn.nodes[node_name].parents:
-                        bn.nodes[node_name].parents.append(p)
-                    bn.children.setdefault(p, [])
-                    if node_name not in bn.children[p]:
-                        bn.children[p].append(node_name)
-                i += 1
-
-            # TABLE
-            if i >= len(content) or content[i] != "TABLE":
-                raise ValueError(
-                    f"Se esperaba 'TABLE' para NODE {node_name}, "
-                    f"se encontró: {content[i] if i < len(content) else 'EOF'}"
-                )
-            i += 1
-
-            # Filas de la tabla hasta ENDNODE
-            while i < len(content) and content[i] != "ENDNODE":
-                row = content[i].split()
-                if parents:
-                    # formato: <padres...> <p(valor1)> <p(valor2)> ...
-                    if len(row) != len(parents) + len(values):
-                        raise ValueError(
-                            f"Línea de tabla mal formateada para nodo {node_name}: {content[i]}"
-                        )
-                    parent_vals = tuple(row[:len(parents)])
-                    prob_vals = row[len(parents):]
-                else:
-                    # sin padres: solo las probabilidades
-                    if len(row) != len(values):
-                        raise ValueError(
-                            f"Línea de tabla mal formateada para nodo {node_name} sin padres: {content[i]}"
-                        )
-                    parent_vals = ()
-                    prob_vals = row
+            line = next(lines, None)
+            while line is not None:
+                if not line.startswith("NODE"):
+                    raise ValueError(f"Se esperaba 'NODE <Nombre>' y se encontró: {line}")
+                _, node_name = line.split(None, 1)
+                node_name = sys.intern(node_name)
+
+                # VALUES
+                line = next(lines, None)
+                parts = line.split() if line is not None else []
+                if not parts or parts[0] != "VALUES":
+                    raise ValueError(
+                        f"Se esperaba 'VALUES' después de NODE {node_name}, "
+                        f"se encontró: {line if line is not None else 'EOF'}"
+                    )
+                values = parts[1:]
+                bn.set_node_info(node_name, values)
+                line = next(lines, None)
+
+                # PARENTS (opcional)
+                parents: List[str] = []
+                if line is not None and line.startswith("PARENTS"):
+                    parents = [sys.intern(p) for p in line.split()[1:]]
+                    # Ajustar padres en el nodo y estructura
+                    for p in parents:
+                        bn.add_edge(p, node_name)
+                    line = next(lines, None)
+
+                # TABLE
+                if line != "TABLE":
+                    raise ValueError(
+                        f"Se esperaba 'TABLE' para NODE {node_name}, "
+                        f"se encontró: {line if line is not None else 'EOF'}"
+                    )
+
+                # Filas de la tabla hasta ENDNODE
+                line = next(lines, None)
+                while line is not None and line != "ENDNODE":
+                    row = line.split()
+                    if parents:
+                        # formato: <padres...> <p(valor1)> <p(valor2)> ...
+                        if len(row) != len(parents) + len(values):
+                            raise ValueError(
+                                f"Línea de tabla mal formateada para nodo {node_name}: {line}"
+                            )
+                        parent_vals = tuple(row[:len(parents)])
+                        prob_vals = row[len(parents):]
+                    else:
+                        # sin padres: solo las probabilidades
+                        if len(row) != len(values):
+                            raise ValueError(
+                                f"Línea de tabla mal formateada para nodo {node_name} sin padres: {line}"
+                            )
+                        parent_vals = ()
+                        prob_vals = row
 
-                value_probs = {val: float(p) for val, p in zip(values, prob_vals)}
-                bn.set_cpt_entry(node_name, parent_vals, value_probs)
-                i += 1
+                    try:
+                        probs = list(map(float, prob_vals))
+                    except ValueError as e:
+                        raise ValueError(
+                            f"Probabilidad no numérica en la tabla del nodo {node_name}: {line}"
+                        ) from e
+                    bn.set_cpt_entry(node_name, parent_vals, dict(zip(values, probs)), validate=False)
+                    line = next(lines, None)
 
-            if i >= len(content) or content[i] != "ENDNODE":
-                raise ValueError(f"Se esperaba 'ENDNODE' para NODE {node_name}")
-            i += 1
+                if line != "ENDNODE":
+                    raise ValueError(f"Se esperaba 'ENDNODE' para NODE {node_name}")
+                line = next(lines, None)
 
+        bn.validate()
         return bn
 
     # ================== Inferencia por enumeración ==================
 
-    def enumeration_ask(self, query_var: str, evidence: Dict[str, str], verbose: bool = False) -> Dict[str, float]:
+    def validate_query(self, query_var: str, evidence: Dict[str, str]):
         """
-        Implementa el algoritmo de inferencia por enumeración (Russell & Norvig).
-        Retorna la distribución P(query_var | evidence).
+        Verifica que query_var y las variables de evidence existan en la red y
+        que cada valor de evidencia esté en el dominio de su variable; si no,
+        lanza InvalidQueryError. Todos los métodos de inferencia la usan.
         """
         if query_var not in self.nodes:
-            raise KeyError(f"Variable de consulta '{query_var}' no existe en la red.")
+            raise InvalidQueryError(f"Variable de consulta '{query_var}' no existe en la red.")
+        for var, val in evidence.items():
+            if var not in self.nodes:
+                raise InvalidQueryError(f"Variable de evidencia '{var}' no existe en la red.")
+            if val not in self.nodes[var].value_index:
+                raise InvalidQueryError(f"Valor '{val}' no válido para la variable de evidencia '{var}'.")
 
-        vars_order = self.topological_order()
+    def enumeration_ask(
+        self, query_var: str, evidence: Dict[str, str], verbose: bool = False, workers: int = 1
+    ) -> Dict[str, float]:
+        """
+        Implementa el algoritmo de inferencia por enumeración (Russell & Norvig).
+        Retorna la distribución P(query_var | evidence).
+        Con workers > 1 (y sin verbose) el término de cada valor de query_var
+        se calcula en un proceso distinto; solo compensa en redes grandes.
+        Sin verbose, si la red es demasiado profunda para el límite de
+        recursión de Python se resuelve con variable_elimination_ask.
+        """
+        self.validate_query(query_var, evidence)
+        self._build_tables()
         node = self.nodes[query_var]
+        query_id = self._node_id[query_var]
         dist: Dict[str, float] = {}
 
-        for value in node.values:
-            extended_evidence = dict(evidence)
-            extended_evidence[query_var] = value
-            if verbose:
+        assignment = self._encode_evidence(evidence)
+
+        # Solo importan los ancestros de la consulta y la evidencia: el resto de
+        # nodos (estériles) suman 1 al marginalizarlos.
+        vars_order = self._ancestors([query_var, *evidence])
+
+        if verbose:
+            for value_idx, value in enumerate(node.values):
+                assignment[query_id] = value_idx
                 print(f"--- Calculando término para {query_var}={value} dado evidencia {evidence} ---")
-            dist[value] = self._enumerate_all(vars_order, extended_evidence, verbose=verbose, depth=0)
-            if verbose:
+                dist[value] = self._enumerate_trace(vars_order, assignment, depth=0)
                 print(f"Resultado sin normalizar para {query_var}={value}: {dist[value]}\n")
 
-        # Normalizar
-        total = sum(dist.values())
-        if total == 0:
-            raise ValueError("La probabilidad total es 0; revise la red o la evidencia.")
-        for v in dist:
-            dist[v] /= total
+            # Normalizar
+            total = sum(dist.values())
+            if total == 0:
+                raise ValueError("La probabilidad total es 0; revise la red o la evidencia.")
+            for v in dist:
+                dist[v] /= total
 
-        if verbose:
             print(f"Distribución normalizada para {query_var} dado {evidence}: {dist}\n")
+            return dist
+
+        # Sin traza solo interesa la distribución normalizada, así que las
+        # variables que la evidencia separa de la consulta se enumeran aparte,
+        # solo para detectar evidencia imposible (probabilidad 0).
+        vars_order, separated = self._split_by_query(vars_order, assignment, query_id)
 
+        # Los núcleos de enumeración usan un marco de pila por variable; si la
+        # red es demasiado profunda para el límite de recursión se resuelve con
+        # la eliminación de variables, que es iterativa y da el mismo resultado.
+        if max(len(vars_order), len(separated)) > sys.getrecursionlimit() // 2:
+            return self.variable_elimination_ask(query_var, evidence)
+
+        if separated:
+            log_p = self._enumerate_all(separated, assignment, 0, self._relevant_by_depth(separated), {})
+            if log_p == -math.inf:
+                raise ValueError("La probabilidad total es 0; revise la red o la evidencia.")
+
+        # Sin traza se trabaja en espacio logarítmico para evitar underflow
+        # cuando hay muchas variables; se normaliza antes de volver a exponenciar.
+        # Un único vector de asignación: la recursión fija y restaura cada
+        # variable en su lugar en vez de copiar la asignación en cada rama.
+        log_values: List[float] = []
+        if workers > 1 and len(node.values) > 1:
+            # La red viaja una vez por proceso (initargs); cada tarea solo
+            # lleva su propia copia de la asignación
+            assignments: List[List[int]] = []
+            for value_idx in range(len(node.values)):
+                extended_assignment = list(assignment)
+                extended_assignment[query_id] = value_idx
+                assignments.append(extended_assignment)
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(assignments)),
+                initializer=_init_worker,
+                initargs=(self, vars_order),
+            ) as executor:
+                log_values = list(executor.map(_enumerate_in_worker, assignments))
+        else:
+            assignment[query_id] = 0
+            kernel, restrictions = self._compile_kernel(vars_order, assignment, query_id)
+            # Tablas restringidas y memoización propias de esta consulta, una
+            # por profundidad; las comparten todos los valores de la consulta
+            tables = _restrict_tables(restrictions, assignment)
+            memos: List[dict] = [{} for _ in vars_order]
+            for value_idx in range(len(node.values)):
+                assignment[query_id] = value_idx
+                log_values.append(kernel(assignment, memos, tables))
+        log_dist: Dict[str, float] = dict(zip(node.values, log_values))
+
+        log_total = _logsumexp(list(log_dist.values()))
+        if log_total == -math.inf:
+            raise ValueError("La probabilidad total es 0; revise la red o la evidencia.")
+        for value, log_p in log_dist.items():
+            dist[value] = math.exp(log_p - log_total)
         return dist
 
-    def _enumerate_all(self, vars_order: List[str], evidence: Dict[str, str], verbose: bool, depth: int) -> float:
+    def _encode_evidence(self, evidence: Dict[str, str]) -> List[int]:
+        """
+        Traduce la evidencia (ya revisada con validate_query) al vector de asignación:
+        assignment[id] = índice del valor, -1 si la variable no está asignada.
+        """
+        assignment = [-1] * len(self._node_list)
+        for var, val in evidence.items():
+            assignment[self._node_id[var]] = self.nodes[var].value_index[val]
+        return assignment
+
+    def _ancestors(self, targets: List[str]) -> List[int]:
         """
-        Parte recursiva del algoritmo de enumeración.
+        Retorna los ids de targets junto con todos sus ancestros (recorrido
+        hacia atrás por parent_ids). Como los ids son posiciones en orden
+        topológico, la lista ordenada ya está en orden topológico.
         """
-        if not vars_order:
+        seen = [False] * len(self._node_list)
+        pending = deque(self._node_id[name] for name in targets)
+        for i in pending:
+            seen[i] = True
+        while pending:
+            for pid in self._node_list[pending.popleft()].parent_ids:
+                if not seen[pid]:
+                    seen[pid] = True
+                    pending.append(pid)
+        return [i for i, flag in enumerate(seen) if flag]
+
+    def _split_by_query(
+        self, ids: List[int], assignment: List[int], query_id: int
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Separa ids (en orden topológico) en los nodos conectados a la consulta
+        una vez fijada la evidencia y el resto. Dos nodos están conectados si
+        uno es padre no observado del otro: la CPT de un hijo no depende del
+        valor de un padre observado, así que esa arista se corta. El resto solo
+        aporta un factor constante, que se cancela al normalizar (los valores
+        sin normalizar sí cambian).
+        """
+        neighbors: Dict[int, List[int]] = {i: [] for i in ids}
+        for i in ids:
+            for pid in self._node_list[i].parent_ids:
+                if assignment[pid] < 0 or pid == query_id:
+                    neighbors[i].append(pid)
+                    neighbors[pid].append(i)
+
+        seen = [False] * len(self._node_list)
+        seen[query_id] = True
+        pending = deque([query_id])
+        while pending:
+            for j in neighbors[pending.popleft()]:
+                if not seen[j]:
+                    seen[j] = True
+                    pending.append(j)
+        return [i for i in ids if seen[i]], [i for i in ids if not seen[i]]
+
+    def _relevant_by_depth(self, vars_order: List[int], query_id: int = -1) -> List[Tuple[int, ...]]:
+        """
+        Para cada posición k de vars_order, retorna (ordenados) los ids de las
+        variables de las que depende el resultado de enumerar vars_order[k:]
+        dentro de una misma consulta: las ya asignadas en vars_order[:k] que
+        son padres de alguna variable de vars_order[k:] (la frontera).
+        Las variables de vars_order[k:] no hace falta incluirlas: en ese punto
+        o son evidencia (fija durante la consulta) o aún no están asignadas.
+        La excepción es query_id, si se da: su valor cambia entre las llamadas
+        que comparten la memoización, así que se incluye mientras esté en vars_order[k:].
+        """
+        position = {v: k for k, v in enumerate(vars_order)}
+        query_pos = position.get(query_id, -1)
+        relevant: List[Tuple[int, ...]] = [()] * len(vars_order)
+        parents: set = set()
+        for k in range(len(vars_order) - 1, -1, -1):
+            parents.update(self._node_list[vars_order[k]].parent_ids)
+            frontier = {p for p in parents if position.get(p, k) < k}
+            if k <= query_pos:
+                frontier.add(query_id)
+            relevant[k] = tuple(sorted(frontier))
+        return relevant
+
+    def _enumerate_all(
+        self,
+        vars_order: List[int],
+        assignment: List[int],
+        depth: int,
+        relevant: List[Tuple[int, ...]],
+        cache: Dict[Tuple[int, Tuple[int, ...]], float],
+    ) -> float:
+        """
+        Parte recursiva del algoritmo de enumeración, en espacio logarítmico:
+        retorna log P(asignación de vars_order[depth:] | resto de assignment).
+        vars_order son ids de nodos y assignment el vector de asignación
+        (-1 = variable aún no asignada).
+        Memoiza cada subárbol en cache según la profundidad y la asignación de
+        las variables relevantes (relevant, ver _relevant_by_depth). La clave
+        no incluye la evidencia: cache debe ser nuevo en cada consulta.
+        Es la versión genérica, usada por los workers; en el caso secuencial
+        enumeration_ask usa la versión especializada de _compile_kernel.
+        """
+        if depth == len(vars_order):
+            return 0.0
+
+        key = (depth, tuple(assignment[v] for v in relevant[depth]))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        Y_id = vars_order[depth]
+        parent_ids, strides, log_table, card = self._kernel[Y_id]
+        offset = 0
+        for pid, stride in zip(parent_ids, strides):
+            offset += assignment[pid] * stride
+
+        # Las ramas con probabilidad 0 (log = -inf) no se recorren: el
+        # subárbol quedaría multiplicado por 0 de todos modos.
+        if assignment[Y_id] >= 0:
+            result = log_table[offset + assignment[Y_id]]
+            if result != -math.inf:
+                result += self._enumerate_all(vars_order, assignment, depth + 1, relevant, cache)
+        else:
+            # A diferencia de la traza, la fila no se copia con un slice: con
+            # la poda de ramas en 0 no hay producto punto y la copia no compensa
+            terms: List[float] = []
+            for y_idx in range(card):
+                log_p = log_table[offset + y_idx]
+                if log_p == -math.inf:
+                    continue
+                assignment[Y_id] = y_idx
+                terms.append(log_p + self._enumerate_all(vars_order, assignment, depth + 1, relevant, cache))
+            assignment[Y_id] = -1
+            result = _logsumexp(terms)
+
+        cache[key] = result
+        return result
+
+    def _compile_kernel(self, vars_order: List[int], assignment: List[int], query_id: int):
+        """
+        Genera (y guarda) una versión especializada de _enumerate_all para
+        este orden de variables y este patrón de variables observadas: una
+        función por profundidad, con los ids de padres, strides y la rama
+        observada/no observada fijados en el código.
+        Las tablas del núcleo son las CPT ya restringidas a la evidencia
+        (como el primer paso de la eliminación de variables): el código solo
+        indexa por los padres no observados y por query_id, que no se fija.
+        Retorna (función, restricciones). La función es
+        (assignment, memos, tablas) -> log P; quien llama pone memos, una
+        lista con un dict por profundidad, y las tablas de
+        _restrict_tables(restricciones, assignment). Así la función guardada
+        no tiene estado y distintas consultas no comparten caché ni tablas.
+        Los valores de query_id sí pueden compartir memos: las claves la
+        incluyen donde el subárbol depende de ella.
+        Se guardan los _MAX_COMPILED núcleos usados más recientemente.
+        """
+        observed = tuple(assignment[v] >= 0 for v in vars_order)
+        key = (tuple(vars_order), observed, query_id)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+        if compiled is None:
+            relevant = self._relevant_by_depth(vars_order, query_id)
+            n = len(vars_order)
+            namespace: Dict[str, Any] = {"_logsumexp": _logsumexp, "NEG_INF": -math.inf}
+            restrictions: List[tuple] = [()] * n
+            src: List[str] = []
+            for k in range(n - 1, -1, -1):
+                Y_id = vars_order[k]
+                parent_ids, strides, log_table, card = self._kernel[Y_id]
+                # Los padres observados quedan fijados en la tabla restringida,
+                # y también el valor del propio nodo si es evidencia
+                fixed: List[Tuple[int, int]] = []
+                free: List[Tuple[int, int]] = []
+                for pid, st in zip(parent_ids, strides):
+                    (fixed if assignment[pid] >= 0 and pid != query_id else free).append((pid, st))
+                own_fixed = observed[k] and Y_id != query_id
+                free_cards = tuple(self._kernel[pid][3] for pid, _ in free)
+                new_strides: List[int] = []
+                stride = 1 if own_fixed else card
+                for free_card in reversed(free_cards):
+                    new_strides.append(stride)
+                    stride *= free_card
+                new_strides.reverse()
+                restrictions[k] = (
+                    log_table, fixed, _offsets(free_cards, tuple(st for _, st in free)),
+                    Y_id if own_fixed else -1, card,
+                )
+                key_expr = "".join(f"a[{v}], " for v in relevant[k])
+                offset_expr = " + ".join(f"a[{pid}] * {st}" for (pid, _), st in zip(free, new_strides)) or "0"
+                tail = " + sub(a, m, t)" if k + 1 < n else ""
+                # Todo lo que usa la función se liga como argumento por defecto,
+                # así son variables locales y no búsquedas en el dict global
+                sub_arg = f", sub=e{k + 1}" if tail else ""
+                src.append(f"def e{k}(a, m, t{sub_arg}, NEG_INF=NEG_INF, _logsumexp=_logsumexp):")
+                src.append(f"    memo = m[{k}]")
+                src.append(f"    key = ({key_expr})")
+                src.append("    r = memo.get(key)")
+                src.append("    if r is not None:")
+                src.append("        return r")
+                src.append(f"    lt = t[{k}]")
+                src.append(f"    off = {offset_expr}")
+                if own_fixed:
+                    src.append("    r = lt[off]")
+                    if tail:
+                        src.append("    if r != NEG_INF:")
+                        src.append(f"        r = r{tail}")
+                elif observed[k]:
+                    src.append(f"    r = lt[off + a[{Y_id}]]")
+                    if tail:
+                        src.append("    if r != NEG_INF:")
+                        src.append(f"        r = r{tail}")
+                else:
+                    src.append("    terms = []")
+                    for y_idx in range(card):
+                        src.append(f"    lp = lt[off + {y_idx}]")
+                        src.append("    if lp != NEG_INF:")
+                        src.append(f"        a[{Y_id}] = {y_idx}")
+                        src.append(f"        terms.append(lp{tail})")
+                    src.append(f"    a[{Y_id}] = -1")
+                    src.append("    r = _logsumexp(terms)")
+                src.append("    memo[key] = r")
+                src.append("    return r")
+                src.append("")
+            if n == 0:
+                src.append("def e0(a, m, t):")
+                src.append("    return 0.0")
+            exec(compile("\n".join(src), "<enumeration kernel>", "exec"), namespace)
+            compiled = (namespace["e0"], restrictions)
+            with self._lock:
+                self._compiled[key] = compiled
+                while len(self._compiled) > _MAX_COMPILED:
+                    self._compiled.popitem(last=False)
+        return compiled
+
+    def _enumerate_trace(self, vars_order: List[int], assignment: List[int], depth: int) -> float:
+        """
+        Versión de _enumerate_all que imprime la traza paso a paso (--verbose).
+        Trabaja con probabilidades (no logaritmos) y sin memoización, para que
+        la traza muestre el árbol de enumeración completo.
+        """
+        if depth == len(vars_order):
             return 1.0
 
-        Y = vars_order[0]
-        nodeY = self.nodes[Y]
-        rest = vars_order[1:]
+        Y_id = vars_order[depth]
+        nodeY = self._node_list[Y_id]
+        Y = nodeY.name
         indent = "  " * depth
 
-        # Asignación de padres para Y a partir de la evidencia
-        parent_assignment = {p: evidence[p] for p in nodeY.parents if p in evidence}
-
-        if Y in evidence:
-            probY = nodeY.prob(evidence[Y], parent_assignment)
-            if verbose:
-                print(f"{indent}Y={Y} está en la evidencia como {evidence[Y]}, P={probY}")
-            return probY * self._enumerate_all(rest, evidence, verbose, depth + 1)
+        if assignment[Y_id] >= 0:
+            y_idx = assignment[Y_id]
+            probY = nodeY.prob_idx(y_idx, assignment)
+            print(f"{indent}Y={Y} está en la evidencia como {nodeY.values[y_idx]}, P={probY}")
+            return probY * self._enumerate_trace(vars_order, assignment, depth + 1)
         else:
-            total = 0.0
-            if verbose:
-                print(f"{indent}Y={Y} no está en la evidencia, sumando sobre sus valores...")
-            for y_val in nodeY.values:
-                probY = nodeY.prob(y_val, parent_assignment)
-                if verbose:
-                    print(f"{indent}  Asignando {Y}={y_val}, P={probY}")
-                evidence_extended = dict(evidence)
-                evidence_extended[Y] = y_val
-                subtotal = probY * self._enumerate_all(rest, evidence_extended, verbose, depth + 1)
-                if verbose:
-                    print(f"{indent}  Subtotal para {Y}={y_val}: {subtotal}")
-                total += subtotal
-            if verbose:
-                print(f"{indent}Total para Y={Y}: {total}")
+            # Se calcula la fila P(Y | padres) una sola vez y se combina con los
+            # subresultados de todos los valores de Y en un solo producto punto.
+            probs = nodeY.row(assignment)
+            subresults: List[float] = []
+            print(f"{indent}Y={Y} no está en la evidencia, sumando sobre sus valores...")
+            for y_idx, y_val in enumerate(nodeY.values):
+                print(f"{indent}  Asignando {Y}={y_val}, P={probs[y_idx]}")
+                assignment[Y_id] = y_idx
+                subresults.append(self._enumerate_trace(vars_order, assignment, depth + 1))
+                print(f"{indent}  Subtotal para {Y}={y_val}: {probs[y_idx] * subresults[-1]}")
+            assignment[Y_id] = -1
+            total = sum(map(mul, probs, subresults))
+            print(f"{indent}Total para Y={Y}: {total}")
             return total
 
+    # ================== Inferencia por eliminación de variables ==================
+
+    def variable_elimination_ask(self, query_var: str, evidence: Dict[str, str]) -> Dict[str, float]:
+        """
+        Calcula P(query_var | evidence) por eliminación de variables.
+        Da el mismo resultado que enumeration_ask, pero en lugar de recorrer el
+        árbol de enumeración multiplica factores y suma cada variable oculta
+        una sola vez, en orden de mínimo grado (ver _elimination_order).
+        Es iterativo, así que no depende del límite de recursión de Python.
+        """
+        self.validate_query(query_var, evidence)
+        self._build_tables()
+        query_id = self._node_id[query_var]
+        assignment = self._encode_evidence(evidence)
+        assignment[query_id] = -1
+
+        ids = self._ancestors([query_var, *evidence])
+
+        # Un factor por CPT, con la evidencia ya fijada
+        factors = [self._node_factor(i).restrict(assignment) for i in ids]
+        return self._eliminate(query_id, ids, factors, assignment)
+
+    def variable_elimination_ask_many(self, queries: List[Tuple[str, Dict[str, str]]]) -> List[Dict[str, float]]:
+        """
+        Resuelve varias consultas (query_var, evidence) por eliminación de
+        variables y retorna sus distribuciones en el mismo orden.
+        Las consultas con la misma evidencia comparten los factores ya
+        restringidos, así que cada CPT se restringe una vez por evidencia en
+        lugar de una vez por consulta; el resultado es el de
+        variable_elimination_ask. Todas las consultas se revisan antes de
+        resolver ninguna.
+        """
+        self._build_tables()
+        results: List[Optional[Dict[str, float]]] = [None] * len(queries)
+        # evidencia -> (asignación, posiciones de sus consultas)
+        groups: Dict[frozenset, Tuple[List[int], List[int]]] = {}
+        for position, (query_var, evidence) in enumerate(queries):
+            self.validate_query(query_var, evidence)
+            key = frozenset(evidence.items())
+            if key not in groups:
+                groups[key] = (self._encode_evidence(evidence), [])
+            groups[key][1].append(position)
+
+        for assignment, positions in groups.values():
+            evidence = queries[positions[0]][1]
+            restricted: Dict[int, Factor] = {}
+            for position in positions:
+                query_var = queries[position][0]
+                if query_var in evidence:
+                    # La restricción compartida fijaría también la consulta
+                    results[position] = self.variable_elimination_ask(query_var, evidence)
+                    continue
+                ids = self._ancestors([query_var, *evidence])
+                for i in ids:
+                    if i not in restricted:
+                        restricted[i] = self._node_factor(i).restrict(assignment)
+                factors = [restricted[i] for i in ids]
+                results[position] = self._eliminate(self._node_id[query_var], ids, factors, assignment)
+        return results
+
+    def _eliminate(
+        self, query_id: int, ids: List[int], factors: List[Factor], assignment: List[int]
+    ) -> Dict[str, float]:
+        """
+        Elimina las variables ocultas de ids (las no observadas en assignment,
+        salvo la consulta) de factors, ya restringidos a la evidencia, y
+        retorna la distribución normalizada de la consulta.
+        """
+        node = self._node_list[query_id]
+
+        def product_of(fs: List[Factor]) -> Factor:
+            return reduce(lambda f, g: f.multiply(g).rescaled(), fs)
+
+        hidden = [var for var in ids if var != query_id and assignment[var] < 0]
+        for var in self._elimination_order(factors, hidden):
+            involved = [f for f in factors if var in f.variables]
+            factors = [f for f in factors if var not in f.variables]
+            if len(involved) == 1:
+                summed = involved[0].sum_out(var)
+            else:
+                # El último producto se fusiona con la suma
+                summed = product_of(involved[:-1]).multiply_sum_out(involved[-1], var)
+            factors.append(summed.rescaled())
+
+        result = product_of(factors)
+        dist = dict(zip(node.values, result.table))
+
+        total = sum(dist.values())
+        if total == 0:
+            raise ValueError("La probabilidad total es 0; revise la red o la evidencia.")
+        for v in dist:
+            dist[v] /= total
+        return dist
+
+    @staticmethod
+    def _elimination_order(factors: List[Factor], hidden: List[int]) -> List[int]:
+        """
+        Orden de eliminación voraz de mínimo grado sobre el grafo moral (dos
+        variables son vecinas si aparecen en un mismo factor). Al eliminar una
+        variable sus vecinos quedan conectados entre sí, como en el factor
+        resultante. Los empates se resuelven por orden topológico.
+        """
+        neighbors: Dict[int, set] = {}
+        for f in factors:
+            for var in f.variables:
+                neighbors.setdefault(var, set()).update(f.variables)
+        for var, adj in neighbors.items():
+            adj.discard(var)
+
+        order: List[int] = []
+        pending = set(hidden)
+        while pending:
+            var = min(pending, key=lambda v: (len(neighbors[v]), v))
+            pending.remove(var)
+            order.append(var)
+            adj = neighbors.pop(var)
+            for u in adj:
+                neighbors[u].discard(var)
+                neighbors[u].update(adj - {u})
+        return order
+
+    def _node_factor(self, node_id: int) -> Factor:
+        """Factor P(nodo | padres) construido a partir de la tabla codificada del nodo."""
+        node = self._node_list[node_id]
+        cards = tuple(len(self._node_list[p].values) for p in node.parent_ids) + (len(node.values),)
+        return Factor(node.parent_ids + (node_id,), cards, node.table)
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -360,7 +1205,15 @@ def main():
     )
     parser.add_argument(
         "--verbose", "-v", action="store_true",
-        help="Mostrar traza detallada (paso a paso) de la inferencia."
+        help="Mostrar traza detallada (paso a paso) de la inferencia por enumeración."
+    )
+    parser.add_argument(
+        "--procesos", "-p", type=int, default=1,
+        help="Número de procesos para la enumeración (un valor de la consulta por proceso)."
+    )
+    parser.add_argument(
+        "--metodo", "-m", choices=["enumeracion", "eliminacion"], default="enumeracion",
+        help="Algoritmo de inferencia: enumeración (por defecto) o eliminación de variables."
     )
     args = parser.parse_args()
 
@@ -381,9 +1234,18 @@ def main():
                         f"Formato de evidencia inválido: {item}. Debe ser Var=valor"
                     )
                 var, val = item.split("=", 1)
-                evidence_dict[var] = val
+                evidence_dict[sys.intern(var)] = sys.intern(val)
+        try:
+            bn.validate_query(args.consulta, evidence_dict)
+        except InvalidQueryError as e:
+            parser.error(str(e))
         print(f"Realizando inferencia para {args.consulta} dado evidencia {evidence_dict}")
-        dist = bn.enumeration_ask(args.consulta, evidence_dict, verbose=args.verbose)
+        if args.metodo == "eliminacion":
+            dist = bn.variable_elimination_ask(args.consulta, evidence_dict)
+        else:
+            dist = bn.enumeration_ask(
+                args.consulta, evidence_dict, verbose=args.verbose, workers=args.procesos
+            )
         print(f"Distribución de probabilidad de {args.consulta} dado la evidencia:")
         for val, p in dist.items():
             print(f"  P({args.consulta}={val} | evidencia) = {p:.5f}")
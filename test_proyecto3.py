@@ -0,0 +1,281 @@
+"""
+Pruebas del motor de inferencia: python -m unittest -v
+"""
+import contextlib
+import io
+import math
+import random
+import threading
+import unittest
+from itertools import product
+from typing import Dict, List, Optional
+
+import Proyecto3
+from Proyecto3 import BayesianNetwork
+
+
+def random_network(seed: int, n: int, max_parents: int = 3, zeros: float = 0.0) -> BayesianNetwork:
+    """
+    Red aleatoria (reproducible con seed) de n nodos X0..X{n-1}, en orden topológico.
+    Cada probabilidad es 0 con probabilidad zeros (siempre queda una positiva por fila).
+    """
+    rnd = random.Random(seed)
+    bn = BayesianNetwork()
+    names = [f"X{i}" for i in range(n)]
+    for name in names:
+        bn.set_node_info(name, [f"v{k}" for k in range(rnd.randint(2, 3))])
+    for i, child in enumerate(names):
+        for parent in rnd.sample(names[:i], min(i, rnd.randint(0, max_parents))):
+            bn.add_edge(parent, child)
+    for name in names:
+        node = bn.nodes[name]
+        rows: List[tuple] = [()]
+        for parent in node.parents:
+            rows = [row + (v,) for row in rows for v in bn.nodes[parent].values]
+        for row in rows:
+            weights = [0.0 if rnd.random() < zeros else rnd.random() for _ in node.values]
+            weights[rnd.randrange(len(weights))] += 0.01
+            total = sum(weights)
+            bn.set_cpt_entry(name, row, {v: w / total for v, w in zip(node.values, weights)})
+    return bn
+
+
+def chain_network(n: int) -> BayesianNetwork:
+    """Cadena X0 -> X1 -> ... -> X{n-1} de nodos binarios con probabilidades pequeñas."""
+    bn = BayesianNetwork()
+    for i in range(n):
+        bn.set_node_info(f"X{i}", ["a", "b"])
+    for i in range(1, n):
+        bn.add_edge(f"X{i - 1}", f"X{i}")
+    bn.set_cpt_entry("X0", (), {"a": 0.5, "b": 0.5})
+    for i in range(1, n):
+        bn.set_cpt_entry(f"X{i}", ("a",), {"a": 0.01, "b": 0.99})
+        bn.set_cpt_entry(f"X{i}", ("b",), {"a": 0.02, "b": 0.98})
+    return bn
+
+
+def naive_ask(bn: BayesianNetwork, query_var: str, evidence: Dict[str, str]) -> Optional[Dict[str, float]]:
+    """
+    P(query_var | evidence) sumando la distribución conjunta completa con
+    Node.prob; None si la evidencia tiene probabilidad 0.
+    """
+    names = list(bn.nodes)
+    dist = {v: 0.0 for v in bn.nodes[query_var].values}
+    for values in product(*(bn.nodes[name].values for name in names)):
+        world = dict(zip(names, values))
+        if any(world[var] != val for var, val in evidence.items()):
+            continue
+        p = 1.0
+        for name in names:
+            p *= bn.nodes[name].prob(world[name], world)
+        dist[world[query_var]] += p
+    total = sum(dist.values())
+    if total == 0:
+        return None
+    return {v: p / total for v, p in dist.items()}
+
+
+def assert_same_distribution(test: unittest.TestCase, expected: Dict[str, float], got: Dict[str, float]):
+    test.assertEqual(list(expected), list(got))
+    for value in expected:
+        test.assertAlmostEqual(expected[value], got[value], places=9)
+
+
+def generic_enumeration(bn: BayesianNetwork, query_var: str, evidence: Dict[str, str]) -> Dict[str, float]:
+    """Distribución calculada con _enumerate_all (la versión no generada, la de los workers)."""
+    bn._build_tables()
+    query_id = bn._node_id[query_var]
+    assignment = bn._encode_evidence(evidence)
+    vars_order = bn._ancestors([query_var, *evidence])
+    # Una sola caché para todos los valores de la consulta, como en el núcleo generado
+    relevant = bn._relevant_by_depth(vars_order, query_id)
+    cache: dict = {}
+    log_values = []
+    for value_idx in range(len(bn.nodes[query_var].values)):
+        assignment[query_id] = value_idx
+        log_values.append(bn._enumerate_all(vars_order, assignment, 0, relevant, cache))
+    log_total = Proyecto3._logsumexp(log_values)
+    if log_total == -math.inf:
+        raise ValueError("La probabilidad total es 0")
+    return {v: math.exp(lp - log_total) for v, lp in zip(bn.nodes[query_var].values, log_values)}
+
+
+class InferenceAgreementTest(unittest.TestCase):
+    """Todos los caminos de inferencia deben dar lo mismo que sumar la conjunta."""
+
+    def methods(self, bn: BayesianNetwork):
+        def verbose(q, ev):
+            with contextlib.redirect_stdout(io.StringIO()):
+                return bn.enumeration_ask(q, ev, verbose=True)
+
+        return {
+            "kernel": bn.enumeration_ask,
+            "generic": lambda q, ev: generic_enumeration(bn, q, ev),
+            "verbose": verbose,
+            "elimination": bn.variable_elimination_ask,
+            "many": lambda q, ev: bn.variable_elimination_ask_many([(q, ev)])[0],
+        }
+
+    def test_random_networks(self):
+        # Con evidencia en pocos nodos casi siempre quedan nodos estériles que
+        # la poda de ancestros descarta
+        rnd = random.Random(0)
+        for seed in range(40):
+            bn = random_network(seed, n=rnd.randint(3, 8), zeros=0.3)
+            names = list(bn.nodes)
+            methods = self.methods(bn)
+            for _ in range(8):
+                query_var = rnd.choice(names)
+                others = [name for name in names if name != query_var]
+                evidence = {var: rnd.choice(bn.nodes[var].values)
+                            for var in rnd.sample(others, rnd.randint(0, min(3, len(others))))}
+                expected = naive_ask(bn, query_var, evidence)
+                for method_name, ask in methods.items():
+                    with self.subTest(seed=seed, method=method_name, query=query_var, evidence=evidence):
+                        if expected is None:
+                            with self.assertRaises(ValueError):
+                                ask(query_var, evidence)
+                        else:
+                            assert_same_distribution(self, expected, ask(query_var, evidence))
+
+    def test_workers(self):
+        bn = random_network(seed=5, n=10)
+        for query_var, evidence in [("X9", {}), ("X4", {"X8": "v0"}), ("X7", {"X1": "v1", "X9": "v0"})]:
+            with self.subTest(query=query_var, evidence=evidence):
+                assert_same_distribution(
+                    self, naive_ask(bn, query_var, evidence), bn.enumeration_ask(query_var, evidence, workers=2)
+                )
+
+    def test_batch_of_queries(self):
+        # Varias consultas por evidencia, incluida una sobre una variable observada:
+        # como en enumeration_ask, el valor observado de la consulta no se usa
+        bn = random_network(seed=4, n=9)
+        queries = [(q, ev) for ev in ({}, {"X3": "v1"}, {"X3": "v1", "X7": "v0"}) for q in ("X0", "X3", "X5", "X8")]
+        for (query_var, evidence), got in zip(queries, bn.variable_elimination_ask_many(queries)):
+            others = {var: val for var, val in evidence.items() if var != query_var}
+            with self.subTest(query=query_var, evidence=evidence):
+                assert_same_distribution(self, naive_ask(bn, query_var, others), got)
+
+    def test_unknown_inputs_are_rejected(self):
+        bn = random_network(seed=1, n=4)
+        def many(q, ev):
+            # La consulta inválida va después de una válida con otra evidencia
+            return bn.variable_elimination_ask_many([("X1", {}), (q, ev)])
+
+        for ask in (bn.enumeration_ask, bn.variable_elimination_ask, many):
+            with self.assertRaises(Proyecto3.InvalidQueryError):
+                ask("X0", {"X9": "v0"})
+            with self.assertRaises(Proyecto3.InvalidQueryError):
+                ask("X0", {"X1": "v9"})
+            with self.assertRaises(Proyecto3.InvalidQueryError):
+                ask("X9", {"X9": "v0"})
+
+    def test_compiled_kernels_are_bounded(self):
+        bn = random_network(seed=3, n=12)
+        names = list(bn.nodes)
+        for query_var in names:
+            for evidence_var in names:
+                if evidence_var != query_var:
+                    bn.enumeration_ask(query_var, {evidence_var: bn.nodes[evidence_var].values[0]})
+        self.assertLessEqual(len(bn._compiled), Proyecto3._MAX_COMPILED)
+
+    def test_same_shape_different_evidence(self):
+        # Misma consulta y mismas variables observadas: comparten núcleo, pero
+        # la memoización de una no debe servir para la otra
+        bn = random_network(seed=2, n=9)
+        for evidence in [{"X2": "v0", "X6": "v1"}, {"X2": "v1", "X6": "v0"}, {"X2": "v0", "X6": "v1"}]:
+            for method_name, ask in self.methods(bn).items():
+                with self.subTest(method=method_name, evidence=evidence):
+                    assert_same_distribution(self, naive_ask(bn, "X8", evidence), ask("X8", evidence))
+
+    def test_observed_parents_change_value(self):
+        # X1 es padre observado de X2: la tabla restringida de X2 cambia con su valor
+        bn = random_network(seed=2, n=9)
+        for value in bn.nodes["X1"].values:
+            evidence = {"X1": value, "X3": "v0"}
+            for method_name, ask in self.methods(bn).items():
+                with self.subTest(method=method_name, evidence=evidence):
+                    assert_same_distribution(self, naive_ask(bn, "X5", evidence), ask("X5", evidence))
+
+    def test_long_evidence_chain(self):
+        # P(evidencia) ~ 1e-340 no cabe en un float: sin logaritmos daría 0.
+        # X2 es evidencia, así que el resultado es el de la cadena X0 -> X1 -> X2.
+        bn = chain_network(401)
+        evidence = {f"X{i}": "a" for i in range(2, 401, 2)}
+        expected = naive_ask(chain_network(3), "X1", {"X2": "a"})
+        for ask in (bn.enumeration_ask, bn.variable_elimination_ask):
+            with self.subTest(method=ask.__name__):
+                assert_same_distribution(self, expected, ask("X1", evidence))
+
+    def test_deeper_than_recursion_limit(self):
+        # Enumerar X0..X2999 pasaría el límite de recursión: se resuelve con eliminación
+        bn = chain_network(3000)
+        expected = {"a": 0.01, "b": 0.99}
+        assert_same_distribution(self, expected, bn.enumeration_ask("X2999", {"X2998": "a"}))
+
+
+
+class ConcurrentQueriesTest(unittest.TestCase):
+    def test_threads_with_different_evidence_values(self):
+        # Misma consulta y mismas variables observadas en todos los hilos, sobre
+        # una red aún sin construir: comparten núcleo, no memoización ni tablas
+        queries = []
+        reference = random_network(seed=7, n=26)
+        evidence_vars = ["X3", "X11", "X20"]
+        for k in range(6):
+            evidence = {var: reference.nodes[var].values[(k >> i) % len(reference.nodes[var].values)]
+                        for i, var in enumerate(evidence_vars)}
+            queries.append(("X15", evidence))
+        expected = [reference.variable_elimination_ask(q, ev) for q, ev in queries]
+
+        bn = random_network(seed=7, n=26)
+        barrier = threading.Barrier(len(queries))
+        results: List[List[Dict[str, float]]] = [[] for _ in queries]
+
+        def run(i: int):
+            query_var, evidence = queries[i]
+            barrier.wait()
+            for _ in range(30):
+                results[i].append(bn.enumeration_ask(query_var, evidence))
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(queries))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for i, runs in enumerate(results):
+            self.assertEqual(len(runs), 30)
+            for got in runs:
+                assert_same_distribution(self, expected[i], got)
+
+
+class ValidateTest(unittest.TestCase):
+    def network(self) -> BayesianNetwork:
+        bn = BayesianNetwork()
+        bn.set_node_info("A", ["a0", "a1"])
+        bn.set_node_info("B", ["b0", "b1"])
+        bn.add_edge("A", "B")
+        bn.set_cpt_entry("A", (), {"a0": 0.5, "a1": 0.5})
+        for a in ("a0", "a1"):
+            bn.set_cpt_entry("B", (a,), {"b0": 0.5, "b1": 0.5})
+        return bn
+
+    def test_complete_network(self):
+        self.network().validate()
+
+    def test_parent_without_values(self):
+        bn = self.network()
+        bn.add_edge("C", "B")
+        with self.assertRaisesRegex(ValueError, "padre C del nodo B"):
+            bn.validate()
+
+    def test_unknown_parent_value(self):
+        bn = self.network()
+        bn.set_cpt_entry("B", ("a2",), {"b0": 0.5, "b1": 0.5})
+        with self.assertRaisesRegex(ValueError, "desconocidos"):
+            bn.validate()
+
+
+if __name__ == "__main__":
+    unittest.main()